@@ -2,12 +2,205 @@
 # It will also be responsible for determining the valid moves at the current state.
 # It will also keep a move log
 
+import random
+
+# Squares are numbered 0-63 as row*8 + col, so bit 0 of a bitboard is a8 (top left of the board as drawn)
+# and bit 63 is h1. A piece is a small int: the low 3 bits are the piece type, bit 3 is the color.
+WHITE, BLACK = 0, 8
+EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(7)
+PIECES = (WHITE | PAWN, WHITE | KNIGHT, WHITE | BISHOP, WHITE | ROOK, WHITE | QUEEN, WHITE | KING,
+          BLACK | PAWN, BLACK | KNIGHT, BLACK | BISHOP, BLACK | ROOK, BLACK | QUEEN, BLACK | KING)
+PIECE_NAMES = ("--", "wp", "wN", "wB", "wR", "wQ", "wK", "--", "--", "bp", "bN", "bB", "bR", "bQ", "bK")
+PIECE_CODES = {PIECE_NAMES[piece]: piece for piece in PIECES}
+MASK64 = (1 << 64) - 1
+
+# The engine passes moves around as single ints instead of Move objects:
+# bits 0-5 are the start square, bits 6-11 the end square, bits 12-15 the piece moved,
+# bits 16-19 the piece captured (EMPTY for a quiet move), then one flag bit each for the special moves below.
+ENPASSANT_FLAG = 1 << 20
+CASTLE_FLAG = 1 << 21
+PROMOTION_FLAG = 1 << 22 # pawn promotion, always to a queen
+
+# Move ordering: captures first by MVV-LVA (most valuable victim, then least valuable attacker),
+# then the killer moves of the current search ply, then quiet moves by history score
+PIECE_VALUES = (0, 1, 3, 3, 5, 9, 20) # indexed by piece type, the king only ever shows up as an attacker
+CAPTURE_ORDER = 1 << 40
+KILLER_ORDER = 1 << 39
+MAX_PLY = 64 # deepest search ply that keeps killer moves
+
+VALID_MOVES_CACHE_SIZE = 1 << 16 # positions whose valid moves are remembered, the least recently used is dropped past this
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+# Magic multipliers for the sliding piece lookup tables, found offline by random search.
+# (occupied & mask) * magic >> shift maps every relevant blocker set of a square to its own table slot.
+ROOK_MAGICS = (
+    0x2180008040012010, 0x8240001000402001, 0x02000A1040220080, 0x0480080004100080,
+    0x820002000408A090, 0x0100080204000100, 0x0400281010A11402, 0x8200020020804104,
+    0x0004800183400220, 0x0E03004001008221, 0x2002001224420080, 0xA04E800800100081,
+    0x0121001100080204, 0x3008808004008200, 0x8001000401000200, 0x400200010880440A,
+    0x0080008020400081, 0x4000808040002000, 0x9030008018802000, 0x0004090010002300,
+    0x0200808004000800, 0x0101080110402004, 0x1188040008024110, 0x21000200004A8704,
+    0x1040802380044008, 0x01026003401000C7, 0x8410040020080020, 0x0010880280100080,
+    0x9444000480800800, 0x0000400801042090, 0x40110041001C2A00, 0x2408240200008041,
+    0x4400400028800088, 0x2400201000400040, 0x8000200080801000, 0x1210005081800800,
+    0x0001000801001004, 0x0020800200800400, 0x5043000481000200, 0x0009004422001089,
+    0x0820400080008020, 0x5110002000404000, 0x8000802200420012, 0x260010002101000A,
+    0x2800880100050010, 0x4482000810020004, 0x4001020001008080, 0x410511A043020004,
+    0x0810800020410100, 0x2000320080410200, 0x0004100020048880, 0x0000420010082200,
+    0x0008004200240140, 0x0800800200040080, 0x000010C822010400, 0x38C4800100004080,
+    0x4908800500241041, 0x8202048020104102, 0xA700081100200041, 0x4011000410000821,
+    0x1107000408000211, 0x000D0008CA1C0001, 0x10090004120000A1, 0x0060082244011082,
+)
+BISHOP_MAGICS = (
+    0xD404882841040010, 0x0808810802004100, 0x0034044892002A00, 0x0004042483000408,
+    0x0102021001000000, 0x4058480210400000, 0x05A1044220040008, 0x0200240202100208,
+    0x0408081004008410, 0x004002280A108A00, 0x20A042108A088000, 0x5000040411920080,
+    0x01210404200100A2, 0x2800039010082064, 0x0000010111304088, 0x0110004208010820,
+    0x2804012120022241, 0x6082000808014400, 0x0102201000820208, 0x0044006240108000,
+    0x0041000820082300, 0x0400800808842004, 0x0024240207112801, 0x80020005430C0110,
+    0x0042202050210240, 0x4002100008390860, 0x0801010010040620, 0x0B04080109010500,
+    0x0003011001004000, 0xC008020040410084, 0x0012004108880800, 0x8000802B01040200,
+    0x0004212400083000, 0x0A180C0D00100140, 0x0202030240100180, 0x000A0100C01C00C0,
+    0x20A0010401150408, 0xC010110040420040, 0x5042020200004840, 0x0800808084420200,
+    0x1248080249101008, 0x20408A0920049013, 0x4000220030002200, 0x8020002124002808,
+    0x0040481904440400, 0x7224102040418202, 0x1002700400801100, 0x000200A121002A00,
+    0x0300822120A00000, 0x20012203102880B8, 0x0002210048120001, 0x0002A00104883101,
+    0x00108040850108A8, 0x008D100610231211, 0x0229080198020242, 0x0004189811012300,
+    0x9001003801041040, 0x2101003088041000, 0x1001431100889084, 0x0812020010420200,
+    0x62002000A0224402, 0x002000C0C8010100, 0x8000302008C08088, 0x0202043000920080,
+)
+
+# Squares reachable from each square by a single knight or king step
+def buildStepAttacks(offsets):
+    attacks = []
+    for sq in range(64):
+        row, col = sq >> 3, sq & 7
+        bb = 0
+        for dRow, dCol in offsets:
+            endRow, endCol = row + dRow, col + dCol
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                bb |= 1 << (endRow * 8 + endCol)
+        attacks.append(bb)
+    return attacks
+
+# For every square, one tuple per direction holding the squares along that ray, nearest first
+def buildRays(directions):
+    rays = []
+    for sq in range(64):
+        squareRays = []
+        for dRow, dCol in directions:
+            ray = []
+            row, col = (sq >> 3) + dRow, (sq & 7) + dCol
+            while 0 <= row < 8 and 0 <= col < 8:
+                ray.append(row * 8 + col)
+                row += dRow
+                col += dCol
+            squareRays.append(tuple(ray))
+        rays.append(tuple(squareRays))
+    return rays
+
+# Squares a slider on sq attacks given the occupied squares, walking each ray until it hits a piece.
+# Only used to fill the magic tables at import.
+def slidingAttacks(sq, occupied, rays):
+    attacks = 0
+    for ray in rays[sq]:
+        for target in ray:
+            attacks |= 1 << target
+            if occupied >> target & 1:
+                break
+    return attacks
+
+# Squares whose occupancy matters for a slider on sq (the board edge at the end of each ray never blocks anything)
+def relevantMask(sq, rays):
+    mask = 0
+    for ray in rays[sq]:
+        for target in ray[:-1]:
+            mask |= 1 << target
+    return mask
+
+def buildMagicTables(magics, rays):
+    masks, shifts, tables = [], [], []
+    for sq in range(64):
+        mask = relevantMask(sq, rays)
+        shift = 64 - bin(mask).count("1")
+        table = [0] * (1 << (64 - shift))
+        blockers = 0
+        while True: # visit every subset of the mask (carry-rippler trick)
+            table[((blockers * magics[sq]) & MASK64) >> shift] = slidingAttacks(sq, blockers, rays)
+            blockers = (blockers - mask) & mask
+            if blockers == 0:
+                break
+        masks.append(mask)
+        shifts.append(shift)
+        tables.append(table)
+    return masks, shifts, tables
+
+# BETWEEN[a][b] holds the squares strictly between a and b when they share a rank, file or diagonal, 0 otherwise
+def buildBetween(raySets):
+    between = [[0] * 64 for sq in range(64)]
+    for rays in raySets:
+        for sq in range(64):
+            for ray in rays[sq]:
+                line = 0
+                for target in ray:
+                    between[sq][target] = line
+                    line |= 1 << target
+    return between
+
+KNIGHT_ATTACKS = buildStepAttacks(KNIGHT_OFFSETS)
+KING_ATTACKS = buildStepAttacks(KING_OFFSETS)
+# Masks for the pawn shifts: a file to drop before shifting a capture sideways so it can't wrap onto the next rank,
+# and the rank a pawn reaches with its first step, where it may step again
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+WHITE_PUSH_RANK = 0xFF << 40 # the 3rd rank
+BLACK_PUSH_RANK = 0xFF << 16 # the 6th rank
+PAWN_ATTACKS = (buildStepAttacks(((-1, -1), (-1, 1))), buildStepAttacks(((1, -1), (1, 1)))) # indexed by side (white, black), then square
+ROOK_RAYS = buildRays(ROOK_DIRECTIONS)
+BISHOP_RAYS = buildRays(BISHOP_DIRECTIONS)
+ROOK_MASKS, ROOK_SHIFTS, ROOK_TABLE = buildMagicTables(ROOK_MAGICS, ROOK_RAYS)
+BISHOP_MASKS, BISHOP_SHIFTS, BISHOP_TABLE = buildMagicTables(BISHOP_MAGICS, BISHOP_RAYS)
+ROOK_LINES = [slidingAttacks(sq, 0, ROOK_RAYS) for sq in range(64)] # rook moves on an empty board
+BISHOP_LINES = [slidingAttacks(sq, 0, BISHOP_RAYS) for sq in range(64)]
+BETWEEN = buildBetween((ROOK_RAYS, BISHOP_RAYS))
+
+def rookAttacks(sq, occupied):
+    return ROOK_TABLE[sq][(((occupied & ROOK_MASKS[sq]) * ROOK_MAGICS[sq]) & MASK64) >> ROOK_SHIFTS[sq]]
+
+def bishopAttacks(sq, occupied):
+    return BISHOP_TABLE[sq][(((occupied & BISHOP_MASKS[sq]) * BISHOP_MAGICS[sq]) & MASK64) >> BISHOP_SHIFTS[sq]]
+
+# Fields of a packed move
+def moveFrom(move):
+    return move & 63
+
+def moveTo(move):
+    return move >> 6 & 63
+
+def movePiece(move):
+    return move >> 12 & 15
+
+def moveCaptured(move):
+    return move >> 16 & 15
+
+# Random keys for Zobrist hashing. A position's key is the XOR of the keys of everything in it,
+# so a move only has to XOR out what it changes and XOR in the result.
+ZOBRIST_RANDOM = random.Random(0xC0FFEE)
+ZOBRIST_PIECE = [[ZOBRIST_RANDOM.getrandbits(64) for sq in range(64)] for piece in range(15)] # indexed by piece code, then square
+ZOBRIST_SIDE = ZOBRIST_RANDOM.getrandbits(64) # black to move
+ZOBRIST_CASTLING = [ZOBRIST_RANDOM.getrandbits(64) for rights in range(16)] # indexed by wks | wqs<<1 | bks<<2 | bqs<<3
+ZOBRIST_ENPASSANT = [ZOBRIST_RANDOM.getrandbits(64) for col in range(8)] # indexed by the column of the en passant square
+
 class GameState():
     def __init__(self):
-        # board is an 8x8 2d list, each element of the list has 2 characters.
-        # The first character represents the color of the piece, 'b' or 'w'
-        # "--" represents an empty space with no piece.
-        self.board = [
+        # board holds the piece code on each of the 64 squares (EMPTY for an empty square), indexed by row*8 + col.
+        # pieces holds one bitboard per piece, indexed by the piece code: bit n is set when that piece is on square n.
+        # occupancy holds all white and all black pieces, occupied is both together.
+        startingBoard = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR" ],
             ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
             ["--", "--", "--", "--", "--", "--", "--", "--"],
@@ -17,285 +210,435 @@ class GameState():
             ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
         ]
-        self.moveFunctions = {"p":self.getPawnMoves, "R":self.getRookMoves, "K":self.getKingMoves, 
-                              "Q":self.getQueenMoves, "N":self.getKnightMoves, "B":self.getBishopMoves}
+        self.board = bytearray(64)
+        self.pieces = [0] * 15
+        self.occupancy = [0, 0]
+        for row in range(8):
+            for col in range(8):
+                if startingBoard[row][col] != "--":
+                    piece = PIECE_CODES[startingBoard[row][col]]
+                    self.board[row * 8 + col] = piece
+                    self.pieces[piece] |= 1 << (row * 8 + col)
+                    self.occupancy[piece >> 3] |= 1 << (row * 8 + col)
+        self.occupied = self.occupancy[0] | self.occupancy[1]
         self.whiteToMove = True
         self.moveLog = []
-        self.blackKingLocation = (0, 4)
-        self.whiteKingLocation = (7, 4)
+        self.kingSquares = [60, 4] # square of each king, indexed by side (white, black)
         self.checkmate = False
         self.stalemate = False
         self.enpassantPossible = () # coordinates for the square where an enpassant capture is possible
+        self.enpassantPossibleLog = [self.enpassantPossible]
         self.currentCastlingRights = CastleRights(True, True, True, True)
         self.castleRightsLog = [CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.wqs,
                                              self.currentCastlingRights.bks, self.currentCastlingRights.bqs)]
+        self.zobrist = self.computeZobrist() # position key, kept up to date by makeMove/undoMove
+        self.killers = [[0, 0] for ply in range(MAX_PLY)] # two quiet moves per search ply that caused a cutoff in the search
+        self.searchRoot = 0 # len(moveLog) when the current search started, search plies count from here
+        self.history = {} # (from, to, piece) bits of a quiet move -> how often it caused a cutoff, weighted by depth
+        self.validMovesCache = {} # zobrist key -> (tuple of unordered valid moves, in check), kept in least to most recently used order
+
+    # Zobrist key of the position built from scratch
+    def computeZobrist(self):
+        key = 0
+        for piece in PIECES:
+            bb = self.pieces[piece]
+            while bb:
+                key ^= ZOBRIST_PIECE[piece][(bb & -bb).bit_length() - 1]
+                bb &= bb - 1
+        if not self.whiteToMove:
+            key ^= ZOBRIST_SIDE
+        return key ^ self.zobristRightsKey()
+
+    # Zobrist key of the castling rights and en passant square, XORed out before a move changes them and back in after
+    def zobristRightsKey(self):
+        rights = self.currentCastlingRights
+        key = ZOBRIST_CASTLING[rights.wks | rights.wqs << 1 | rights.bks << 2 | rights.bqs << 3]
+        if self.enpassantPossible:
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        return key
+
+    # XOR the pieces of a move on or off the bitboards, applying it twice puts everything back
+    # The zobrist key gets the same treatment, along with the side to move.
+    # The board squares can't be XORed, so they are written for the direction given by undo.
+    def updateBitboards(self, move, undo=False):
+        pieces, occupancy, board = self.pieces, self.occupancy, self.board
+        startSq, endSq, piece, captured = move & 63, move >> 6 & 63, move >> 12 & 15, move >> 16 & 15
+        side = piece >> 3
+        endBit = 1 << endSq
+        moveBits = (1 << startSq) | endBit
+        pieces[piece] ^= moveBits
+        occupancy[side] ^= moveBits
+        key = self.zobrist ^ ZOBRIST_SIDE ^ ZOBRIST_PIECE[piece][startSq] ^ ZOBRIST_PIECE[piece][endSq]
+        if undo:
+            board[endSq] = EMPTY
+            board[startSq] = piece
+        else:
+            board[startSq] = EMPTY
+            board[endSq] = piece
+        if captured != EMPTY:
+            capturedSq = (startSq & ~7) | (endSq & 7) if move & ENPASSANT_FLAG else endSq # en passant takes the pawn beside the start square
+            pieces[captured] ^= 1 << capturedSq
+            occupancy[side ^ 1] ^= 1 << capturedSq
+            key ^= ZOBRIST_PIECE[captured][capturedSq]
+            if undo:
+                board[capturedSq] = captured
+            elif capturedSq != endSq:
+                board[capturedSq] = EMPTY
+        if move & PROMOTION_FLAG:
+            pieces[piece] ^= endBit
+            pieces[piece & BLACK | QUEEN] ^= endBit
+            key ^= ZOBRIST_PIECE[piece][endSq] ^ ZOBRIST_PIECE[piece & BLACK | QUEEN][endSq]
+            if not undo:
+                board[endSq] = piece & BLACK | QUEEN
+        if move & CASTLE_FLAG:
+            if endSq > startSq: # kingside castle move
+                rookFrom, rookTo = endSq + 1, endSq - 1
+            else: # queenside castle
+                rookFrom, rookTo = endSq - 2, endSq + 1
+            rookBits = (1 << rookFrom) | (1 << rookTo)
+            pieces[piece & BLACK | ROOK] ^= rookBits
+            occupancy[side] ^= rookBits
+            key ^= ZOBRIST_PIECE[piece & BLACK | ROOK][rookFrom] ^ ZOBRIST_PIECE[piece & BLACK | ROOK][rookTo]
+            if undo:
+                board[rookFrom], board[rookTo] = piece & BLACK | ROOK, EMPTY
+            else:
+                board[rookFrom], board[rookTo] = EMPTY, piece & BLACK | ROOK
+        self.zobrist = key
+        self.occupied = occupancy[0] | occupancy[1]
 
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        self.zobrist ^= self.zobristRightsKey()
+        self.updateBitboards(move)
         self.moveLog.append(move) # add move to move bank for undo
         self.whiteToMove = not self.whiteToMove # toggle white turn
-        if move.pieceMoved == "bK":
-            self.blackKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == "wK":
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        # handle special pawn promotion move
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + "Q"
-        
-        # Enpassant move
-        if move.isEnpassantMove:
-            self.board[move.startRow][move.endCol] = "--"
-        
+        startSq, endSq, piece = move & 63, move >> 6 & 63, move >> 12 & 15
+        if piece & 7 == KING:
+            self.kingSquares[piece >> 3] = endSq
+
         # Update enpassantPossible variable
-        if move.pieceMoved[1] == "p" and abs(move.startRow - move.endRow) == 2: # clever way of checking 2 square pawn advance irrespective of color
-            self.enpassantPossible = ((move.startRow + move.endRow) // 2, move.startCol)
+        if piece & 7 == PAWN and abs(startSq - endSq) == 16: # clever way of checking 2 square pawn advance irrespective of color
+            self.enpassantPossible = (((startSq >> 3) + (endSq >> 3)) // 2, startSq & 7)
         else:
             self.enpassantPossible = ()
-        # Castle move
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2: # kingside castle move
-                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1] # moves the rook
-                self.board[move.endRow][move.endCol+1] = "--"
-            else: # queenside castle
-                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2] # moves the rook
-                self.board[move.endRow][move.endCol-2] = "--"
+        self.enpassantPossibleLog.append(self.enpassantPossible)
         # Update castling rights whenever a rook or king moves for the first time
         self.updateCastleRights(move)
         self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.wqs,
                                              self.currentCastlingRights.bks, self.currentCastlingRights.bqs))
+        self.zobrist ^= self.zobristRightsKey()
 
     def undoMove(self):
         if len(self.moveLog) != 0:
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            self.zobrist ^= self.zobristRightsKey()
+            self.updateBitboards(move, undo=True)
             self.whiteToMove = not self.whiteToMove
-            if move.pieceMoved == "bK":
-                self.blackKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == "wK":
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            if move.isEnpassantMove:
-                self.board[move.endRow][move.endCol] = "--" # leave landing square blank
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enpassantPossible = (move.endRow, move.endCol)
-            if move.pieceMoved[1] == "p" and abs(move.startRow - move.endRow) == 2:
-                self.enpassantPossible = ()
+            piece = move >> 12 & 15
+            if piece & 7 == KING:
+                self.kingSquares[piece >> 3] = move & 63
+            # Undo enpassantPossible
+            self.enpassantPossibleLog.pop()
+            self.enpassantPossible = self.enpassantPossibleLog[-1]
             # Undo castling rights
             self.castleRightsLog.pop() # get rid of the new castle rights from the move we are undoing
             newRights = self.castleRightsLog[-1]
-            self.currentCastlingRights = CastleRights(newRights.wks, newRights.wqs, 
+            self.currentCastlingRights = CastleRights(newRights.wks, newRights.wqs,
                                                       newRights.bks, newRights.bqs) # set the current castle rights to the last one in the list
-            # Undo castle move
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2: # kingside
-                    self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1] # move rook back
-                    self.board[move.endRow][move.endCol-1] = "--" # leave a blank where the rook was
-                else: # queenside
-                    self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1] # move rook back
-                    self.board[move.endRow][move.endCol+1] = "--" # leave a blank where the rook was
+            self.zobrist ^= self.zobristRightsKey()
 
     def updateCastleRights(self, move):
-        if move.pieceMoved == "wK":
+        startSq, endSq, piece, captured = move & 63, move >> 6 & 63, move >> 12 & 15, move >> 16 & 15
+        if piece == WHITE | KING:
             self.currentCastlingRights.wks = False
             self.currentCastlingRights.wqs = False
-        elif move.pieceMoved == "bK":
+        elif piece == BLACK | KING:
             self.currentCastlingRights.bks = False
             self.currentCastlingRights.bqs = False
-        elif move.pieceMoved == "wR":
-            if move.startRow == 7:
-                if move.startCol == 0:
-                    self.currentCastlingRights.wqs = False
-                elif move.startCol == 7:
-                    self.currentCastlingRights.wks = False
-        elif move.pieceMoved == "bR":
-            if move.startRow == 0:
-                if move.startCol == 0:
-                    self.currentCastlingRights.bqs = False
-                elif move.startCol == 7:
-                    self.currentCastlingRights.bks = False
-    
+        elif piece == WHITE | ROOK:
+            if startSq == 56:
+                self.currentCastlingRights.wqs = False
+            elif startSq == 63:
+                self.currentCastlingRights.wks = False
+        elif piece == BLACK | ROOK:
+            if startSq == 0:
+                self.currentCastlingRights.bqs = False
+            elif startSq == 7:
+                self.currentCastlingRights.bks = False
+        # A rook captured on its home square can't castle either (the castle move would XOR a missing rook onto the board)
+        if captured == WHITE | ROOK:
+            if endSq == 56:
+                self.currentCastlingRights.wqs = False
+            elif endSq == 63:
+                self.currentCastlingRights.wks = False
+        elif captured == BLACK | ROOK:
+            if endSq == 0:
+                self.currentCastlingRights.bqs = False
+            elif endSq == 7:
+                self.currentCastlingRights.bks = False
+
     # All moves, considers checks
+    # The cache holds the moves unordered, each call orders a fresh list with the current killers and history
     def getValidMoves(self):
-        tempEnpassantPossible = self.enpassantPossible
-        tempCastleRights = CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.wqs,
-                                        self.currentCastlingRights.bks, self.currentCastlingRights.bqs)
-        # 5 step algorithm:
-        # 1) Generate all possible moves
-        moves = self.getAllPossibleMoves()
-        if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-        else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
-        # 2) For each move, make the move
-        for i in range(len(moves)-1, -1, -1):
-            self.makeMove(moves[i])
-            # 3) Generate all opponent's moves
-            # 4) For each of your opponents moves, see if they attack the king
-            self.whiteToMove = not self.whiteToMove # make sure inCheck() is running from the correct perspective 
-            if self.inCheck():
-                moves.remove(moves[i]) # 5) if they do attack your king, not a valid move
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+        cache = self.validMovesCache
+        entry = cache.pop(self.zobrist, None)
+        if entry is None:
+            if len(cache) >= VALID_MOVES_CACHE_SIZE:
+                del cache[next(iter(cache))] # dicts keep insertion order, so the first key is the least recently used
+            entry = self.generateValidMoves()
+        cache[self.zobrist] = entry # (re)insert at the end as the most recently used
+        moves, inCheck = entry
         if len(moves) == 0: # either checkmate or stalemate
-            if self.inCheck():
-                self.checkmate = True
-            else:
-                self.stalemate = True
+            self.checkmate = inCheck
+            self.stalemate = not inCheck
         else: # undo a move where stalemate or checkmate was true
             self.checkmate = False
             self.stalemate = False
-        self.currentCastlingRights = tempCastleRights
-        self.enpassantPossible = tempEnpassantPossible
+        return self.orderMoves(list(moves))
+
+    # Legal moves of the side to move and whether it is in check
+    def generateValidMoves(self):
+        inCheck, pins, checks = self.computePinsAndChecks()
+        kingSq = self.kingSquares[0 if self.whiteToMove else 1]
+        if len(checks) > 1: # double check, only the king can move
+            allowed = 0
+        elif checks: # capture the checking piece or block its line
+            allowed = checks[0]
+        else:
+            allowed = MASK64
+        # only build the attack map when the king has somewhere to go
+        attacked = self.attackedSquares() if KING_ATTACKS[kingSq] & ~self.occupancy[0 if self.whiteToMove else 1] else 0
+        moves = []
+        append, pinLine = moves.append, pins.get
+        for move in self.getAllPossibleMoves():
+            if move >> 12 & 7 == KING:
+                if not attacked >> (move >> 6 & 63) & 1: # the king can't step onto an attacked square
+                    append(move)
+            elif move & ENPASSANT_FLAG:
+                # en passant removes two pieces from a rank so it can uncover a check the pin scan doesn't see,
+                # try these rare moves on the board
+                self.makeMove(move)
+                self.whiteToMove = not self.whiteToMove # make sure inCheck() is running from the correct perspective
+                if not self.inCheck():
+                    append(move)
+                self.whiteToMove = not self.whiteToMove
+                self.undoMove()
+            elif (allowed & pinLine(move & 63, MASK64)) >> (move >> 6 & 63) & 1:
+                append(move)
+        if not inCheck: # can't castle when you are in check
+            self.getCastleMoves(kingSq >> 3, kingSq & 7, moves)
+        return tuple(moves), inCheck
+
+    # Called by a search before it starts, killer moves only apply to the search that found them
+    def startSearch(self):
+        self.searchRoot = len(self.moveLog)
+        self.killers = [[0, 0] for ply in range(MAX_PLY)]
+
+    # Sort moves so a search looks at the likely best ones first
+    def orderMoves(self, moves):
+        ply = len(self.moveLog) - self.searchRoot
+        killer1, killer2 = self.killers[ply] if 0 <= ply < MAX_PLY else (0, 0)
+        history = self.history
+        def orderKey(move):
+            captured = move >> 16 & 15
+            if captured:
+                return CAPTURE_ORDER + PIECE_VALUES[captured & 7] * 32 - PIECE_VALUES[move >> 12 & 7]
+            if move == killer1 or move == killer2:
+                return KILLER_ORDER
+            return history.get(move & 0xFFFF, 0)
+        moves.sort(key=orderKey, reverse=True)
         return moves
 
+    # Called by a search when a quiet move causes a beta cutoff at the current ply
+    def storeKiller(self, move, depth):
+        if move >> 16 & 15: # captures are already ordered by MVV-LVA
+            return
+        ply = len(self.moveLog) - self.searchRoot
+        if 0 <= ply < MAX_PLY and self.killers[ply][0] != move:
+            self.killers[ply][1] = self.killers[ply][0]
+            self.killers[ply][0] = move
+        self.history[move & 0xFFFF] = self.history.get(move & 0xFFFF, 0) + depth * depth
+
+    # Find the pieces pinned to the king and the pieces giving check.
+    # pins maps the square of a pinned piece to the squares it can still move to (its line from the king up to and including the pinner),
+    # checks has one bitboard per checking piece holding the squares that stop that check (the checker and the line between it and the king).
+    def computePinsAndChecks(self):
+        color = WHITE if self.whiteToMove else BLACK
+        enemy = color ^ BLACK
+        kingSq = self.kingSquares[color >> 3]
+        pieces, own, occupied = self.pieces, self.occupancy[color >> 3], self.occupied
+        pins = {}
+        checks = []
+        # a knight or pawn check can only be stopped by capturing the checker
+        # (enemy pawns attack the king from the squares a pawn of our own color on the king square would attack)
+        checkers = (KNIGHT_ATTACKS[kingSq] & pieces[enemy | KNIGHT]) | (PAWN_ATTACKS[color >> 3][kingSq] & pieces[enemy | PAWN])
+        while checkers:
+            checks.append(checkers & -checkers)
+            checkers &= checkers - 1
+        # Enemy sliders lined up with the king give check if nothing stands between them,
+        # and pin the piece in between if that is a single allied piece
+        between = BETWEEN[kingSq]
+        sliders = ((ROOK_LINES[kingSq] & (pieces[enemy | ROOK] | pieces[enemy | QUEEN]))
+                   | (BISHOP_LINES[kingSq] & (pieces[enemy | BISHOP] | pieces[enemy | QUEEN])))
+        while sliders:
+            sq = (sliders & -sliders).bit_length() - 1
+            line = between[sq]
+            blockers = line & occupied
+            if not blockers:
+                checks.append(line | 1 << sq)
+            elif blockers & (blockers - 1) == 0 and blockers & own:
+                pins[blockers.bit_length() - 1] = line | 1 << sq
+            sliders &= sliders - 1
+        return len(checks) > 0, pins, checks
+
+    # Every square the side not to move attacks. Our king is taken off the board first,
+    # so a square behind it on a slider's line counts as attacked and the king can't step back along the check.
+    def attackedSquares(self):
+        enemy = BLACK if self.whiteToMove else WHITE
+        pieces = self.pieces
+        occupied = self.occupied ^ (1 << self.kingSquares[(enemy >> 3) ^ 1])
+        attacked = KING_ATTACKS[self.kingSquares[enemy >> 3]]
+        for piece, table in ((enemy | PAWN, PAWN_ATTACKS[enemy >> 3]), (enemy | KNIGHT, KNIGHT_ATTACKS)):
+            bb = pieces[piece]
+            while bb:
+                attacked |= table[(bb & -bb).bit_length() - 1]
+                bb &= bb - 1
+        bb = pieces[enemy | BISHOP] | pieces[enemy | QUEEN]
+        while bb:
+            attacked |= bishopAttacks((bb & -bb).bit_length() - 1, occupied)
+            bb &= bb - 1
+        bb = pieces[enemy | ROOK] | pieces[enemy | QUEEN]
+        while bb:
+            attacked |= rookAttacks((bb & -bb).bit_length() - 1, occupied)
+            bb &= bb - 1
+        return attacked
+
     def inCheck(self):
-        if self.whiteToMove:
-            return self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
-        else:
-            return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
-
-    # Determine if the enemy can attack square row, col (used with king location)
-    def squareUnderAttack(self, row, col):
-        self.whiteToMove = not self.whiteToMove # switch to opponents POV
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove # switch back from opponents POV
-        for move in oppMoves:
-            if move.endRow == row and move.endCol == col:
-                return True
-        return False
-    
+        kingSq = self.kingSquares[0 if self.whiteToMove else 1]
+        return self.attackersTo(kingSq >> 3, kingSq & 7, not self.whiteToMove)
+
+    # Determine if a piece of the given color attacks square row, col. Attacks are symmetric, so put each kind of piece
+    # on the square and see whether it would hit an enemy piece of that kind; it's all a few ANDs on the bitboards.
+    def attackersTo(self, row, col, byWhite):
+        sq = row * 8 + col
+        enemy = WHITE if byWhite else BLACK
+        pieces, occupied = self.pieces, self.occupied
+        queens = pieces[enemy | QUEEN]
+        return bool((KNIGHT_ATTACKS[sq] & pieces[enemy | KNIGHT])
+                    | (rookAttacks(sq, occupied) & (pieces[enemy | ROOK] | queens))
+                    | (bishopAttacks(sq, occupied) & (pieces[enemy | BISHOP] | queens))
+                    | (PAWN_ATTACKS[(enemy >> 3) ^ 1][sq] & pieces[enemy | PAWN])
+                    | (KING_ATTACKS[sq] & pieces[enemy | KING]))
+
     # All moves, not considering checks
     def getAllPossibleMoves(self):
         moves = []
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                turn = self.board[row][col][0] # color of the piece, "w" or "b"
-                if (turn == "w" and self.whiteToMove) or (turn == "b" and not self.whiteToMove):
-                    piece = self.board[row][col][1]
-                    self.moveFunctions[piece](row, col, moves) # python doesn't have a switch statement
-
+        pieces = self.pieces
+        if self.whiteToMove:
+            self.getWhitePawnMoves(moves)
+        else:
+            self.getBlackPawnMoves(moves)
+        for piece, getMoves in self.WHITE_MOVE_GENERATORS if self.whiteToMove else self.BLACK_MOVE_GENERATORS:
+            bb = pieces[piece]
+            while bb: # one generator call per set bit, lowest square first
+                sq = (bb & -bb).bit_length() - 1
+                getMoves(self, sq, piece, moves)
+                bb &= bb - 1
         return moves
 
-    def getPawnMoves(self, row, col, moves):
-        if self.whiteToMove: # white pawn moves
-            # Pawn pushes
-            if self.board[row-1][col] == "--": # 1 tile pawn push
-                moves.append(Move((row, col), (row-1, col), self.board))
-                # Check 2 spaces ahead only after checking one space ahead!
-                if row == 6 and self.board[row-2][col] == "--": # 2 tile pawn push can only occur on 2nd rank for white pawns
-                    moves.append(Move((row, col),(row -2, col), self.board))
-            # Pawn captures
-            if col - 1 >= 0: # captures to the left (left being col 0)
-                if self.board[row-1][col-1][0] == "b": # enemy piece to capture
-                    moves.append(Move((row, col), (row-1, col-1), self.board))
-                elif (row-1, col-1) == self.enpassantPossible:
-                    moves.append(Move((row, col), (row-1, col-1), self.board, isEnpassantMove=True))
-            if col + 1 < 8: # captures to the right (right being col 7)
-                if self.board[row-1][col+1][0] == "b": # enemy piece to capture
-                    moves.append(Move((row, col), (row-1, col+1), self.board))
-                elif (row-1, col+1) == self.enpassantPossible:
-                    moves.append(Move((row, col), (row-1, col+1), self.board, isEnpassantMove=True))                    
-        else: # black pawn moves
-            # Pawn pushes
-            if self.board[row+1][col] == "--": # 1 tile pawn push
-                moves.append(Move((row, col), (row+1, col), self.board))
-            # Check 2 spaces ahead only after checking one space ahead!
-                if row == 1 and self.board[row+2][col] == "--": # 2 tile pawn push can only occur on 7th rank for black pawns
-                    moves.append(Move((row, col),(row+2, col), self.board))
-            # Pawn captures
-            if col - 1 >= 0: # captures to the left (left being col 0)
-                if self.board[row+1][col-1][0] == "w": # enemy piece to capture
-                    moves.append(Move((row, col), (row+1, col-1), self.board))
-                elif (row+1, col-1) == self.enpassantPossible:
-                    moves.append(Move((row, col), (row+1, col-1), self.board, isEnpassantMove=True))
-            if col + 1 < 8: # captures to the right (right being col 7)
-                if self.board[row+1][col+1][0] == "w": # enemy piece to capture 
-                    moves.append(Move((row, col), (row+1, col+1), self.board))
-                elif (row+1, col+1) == self.enpassantPossible:
-                    moves.append(Move((row, col), (row+1, col+1), self.board, isEnpassantMove=True))
-
-    def getRookMoves(self, row, col, moves):
-        directions = ((-1,0), (1,0), (0,-1), (0,1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for direction in directions:
-            for i in range(1,8): # only need to check a max of 7 tiles in a given direction
-                endRow = row + direction[0] * i
-                endCol = col + direction[1] * i
-                if(0 <= endRow < 8 and 0 <= endCol < 8): # check if spot is on the board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor:
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                        break # quit searching in this direction, can't jump over pieces
-                    else:
-                        break
-                else: # off board
-                    break
-
-    def getKingMoves(self, row, col, moves):
-        kingMoves = ((-1,-1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
-        allyColor = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            endRow = row + kingMoves[i][0]
-            endCol = col + kingMoves[i][1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:# if the spot you're considering isn't already occupied by an ally
-                    moves.append(Move((row, col), (endRow, endCol), self.board))
+    # Add a move from sq to every square in targets that isn't occupied by an ally
+    def addMoves(self, sq, piece, targets, moves):
+        side = piece >> 3
+        targets &= ~self.occupancy[side]
+        append, board = moves.append, self.board
+        start = sq | piece << 12
+        while targets:
+            endSq = (targets & -targets).bit_length() - 1
+            append(start | endSq << 6 | board[endSq] << 16)
+            targets &= targets - 1
+
+    # Pawn moves are generated for all pawns of a side at once by shifting the whole pawn bitboard,
+    # split by color so the shift direction and ranks are constants
+    def getWhitePawnMoves(self, moves):
+        pawns, empty, enemy = self.pieces[WHITE | PAWN], ~self.occupied & MASK64, self.occupancy[1]
+        single = pawns >> 8 & empty # 1 tile pawn push
+        self.addPawnMoves(single, 8, WHITE | PAWN, moves)
+        self.addPawnMoves((single & WHITE_PUSH_RANK) >> 8 & empty, 16, WHITE | PAWN, moves) # 2 tile pawn push from the 2nd rank
+        self.addPawnMoves((pawns & ~FILE_A) >> 9 & enemy, 9, WHITE | PAWN, moves) # captures to the left (left being col 0)
+        self.addPawnMoves((pawns & ~FILE_H) >> 7 & enemy, 7, WHITE | PAWN, moves) # captures to the right (right being col 7)
+        if self.enpassantPossible:
+            endSq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1]
+            self.addEnpassantMoves(PAWN_ATTACKS[1][endSq] & pawns, endSq, WHITE | PAWN, moves)
+
+    def getBlackPawnMoves(self, moves):
+        pawns, empty, enemy = self.pieces[BLACK | PAWN], ~self.occupied & MASK64, self.occupancy[0]
+        single = pawns << 8 & empty # 1 tile pawn push
+        self.addPawnMoves(single, -8, BLACK | PAWN, moves)
+        self.addPawnMoves((single & BLACK_PUSH_RANK) << 8 & empty, -16, BLACK | PAWN, moves) # 2 tile pawn push from the 7th rank
+        self.addPawnMoves((pawns & ~FILE_A) << 7 & enemy, -7, BLACK | PAWN, moves) # captures to the left (left being col 0)
+        self.addPawnMoves((pawns & ~FILE_H) << 9 & enemy, -9, BLACK | PAWN, moves) # captures to the right (right being col 7)
+        if self.enpassantPossible:
+            endSq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1]
+            self.addEnpassantMoves(PAWN_ATTACKS[0][endSq] & pawns, endSq, BLACK | PAWN, moves)
+
+    # Add a pawn move to every square in targets, coming from the square delta away from it
+    def addPawnMoves(self, targets, delta, piece, moves):
+        append, board = moves.append, self.board
+        while targets:
+            endSq = (targets & -targets).bit_length() - 1
+            move = (endSq + delta) | endSq << 6 | piece << 12 | board[endSq] << 16
+            if endSq < 8 or endSq >= 56: # reaching the last rank promotes
+                move |= PROMOTION_FLAG
+            append(move)
+            targets &= targets - 1
+
+    # Add an en passant capture onto endSq for each pawn in pawns
+    def addEnpassantMoves(self, pawns, endSq, piece, moves):
+        captured = (piece ^ BLACK) << 16
+        while pawns:
+            moves.append((pawns & -pawns).bit_length() - 1 | endSq << 6 | piece << 12 | captured | ENPASSANT_FLAG)
+            pawns &= pawns - 1
+
+    def getRookMoves(self, sq, piece, moves):
+        self.addMoves(sq, piece, rookAttacks(sq, self.occupied), moves)
+
+    def getKingMoves(self, sq, piece, moves):
+        self.addMoves(sq, piece, KING_ATTACKS[sq], moves)
 
     def getCastleMoves(self, row, col, moves):
-        if self.squareUnderAttack(row, col):
-            return # can't castle when you are in check
         if (self.whiteToMove and self.currentCastlingRights.wks) or (not self.whiteToMove and self.currentCastlingRights.bks):
             self.getKingsideCastleMoves(row, col, moves)
         if (self.whiteToMove and self.currentCastlingRights.wqs) or (not self.whiteToMove and self.currentCastlingRights.bqs):
             self.getQueensideCastleMoves(row, col, moves)
 
     def getKingsideCastleMoves(self, row, col, moves):
-        if self.board[row][col+1] == "--" and self.board[row][col+2] == "--":
-            if not self.squareUnderAttack(row, col + 1) and not self.squareUnderAttack(row, col + 2):
-                moves.append(Move((row, col), (row, col + 2), self.board, isCastleMove = True))
+        sq = row * 8 + col
+        if not self.occupied & ((1 << (sq+1)) | (1 << (sq+2))):
+            if not self.attackersTo(row, col + 1, not self.whiteToMove) and not self.attackersTo(row, col + 2, not self.whiteToMove):
+                moves.append(sq | (sq + 2) << 6 | self.board[sq] << 12 | CASTLE_FLAG)
 
     def getQueensideCastleMoves(self, row, col, moves):
-        if self.board[row][col-1] == "--" and self.board[row][col-2] == "--" and self.board[row][col-3] == "--":
-            if not self.squareUnderAttack(row, col - 1) and not self.squareUnderAttack(row, col - 2):
-                moves.append(Move((row, col), (row, col - 2), self.board, isCastleMove = True))
-    
-    def getQueenMoves(self, row, col, moves):
-        self.getRookMoves(row, col, moves)
-        self.getBishopMoves(row, col, moves)
-
-    def getKnightMoves(self, row, col, moves):
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        allyColor = "w" if self.whiteToMove else "b"
-        for knightMove in knightMoves:
-            endRow = row + knightMove[0]
-            endCol = col + knightMove[1]
-            if(0 <= endRow < 8 and 0 <= endCol < 8):
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:
-                    moves.append(Move((row, col), (endRow, endCol), self.board))
-
-    def getBishopMoves(self, row, col, moves):
-        directions = ((-1,-1), (-1,1), (1,-1), (1,1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for direction in directions:
-            for i in range(1,8): # only need to check a max of 7 tiles in a given direction
-                endRow = row + direction[0] * i
-                endCol = col + direction[1] * i
-                if(0 <= endRow < 8 and 0 <= endCol < 8): # check if spot is on the board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor:
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                        break # quit searching in this direction, can't jump over pieces
-                    else:
-                        break
-                else: # off board
-                    break
+        sq = row * 8 + col
+        if not self.occupied & ((1 << (sq-1)) | (1 << (sq-2)) | (1 << (sq-3))):
+            if not self.attackersTo(row, col - 1, not self.whiteToMove) and not self.attackersTo(row, col - 2, not self.whiteToMove):
+                moves.append(sq | (sq - 2) << 6 | self.board[sq] << 12 | CASTLE_FLAG)
+
+    def getQueenMoves(self, sq, piece, moves):
+        occupied = self.occupied
+        self.addMoves(sq, piece, rookAttacks(sq, occupied) | bishopAttacks(sq, occupied), moves)
+
+    def getKnightMoves(self, sq, piece, moves):
+        self.addMoves(sq, piece, KNIGHT_ATTACKS[sq], moves)
+
+    def getBishopMoves(self, sq, piece, moves):
+        self.addMoves(sq, piece, bishopAttacks(sq, self.occupied), moves)
+
+    # Generator function for each of a side's pieces other than pawns, used by getAllPossibleMoves, which passes the piece code along
+    # so the generators don't need to look up the side to move.
+    # These are the plain functions rather than bound methods, so there is no per-call lookup and no reference cycle.
+    WHITE_MOVE_GENERATORS = ((WHITE | KNIGHT, getKnightMoves), (WHITE | BISHOP, getBishopMoves),
+                             (WHITE | ROOK, getRookMoves), (WHITE | QUEEN, getQueenMoves), (WHITE | KING, getKingMoves))
+    BLACK_MOVE_GENERATORS = ((BLACK | KNIGHT, getKnightMoves), (BLACK | BISHOP, getBishopMoves),
+                             (BLACK | ROOK, getRookMoves), (BLACK | QUEEN, getQueenMoves), (BLACK | KING, getKingMoves))
 
 class CastleRights():
     def __init__(self, wks, wqs, bks, bqs):
@@ -304,28 +647,38 @@ class CastleRights():
         self.bks = bks
         self.bqs = bqs
 
+# Readable form of a move for the UI, the engine itself works on packed ints
 class Move():
+    __slots__ = ("startSq", "endSq", "startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured",
+                 "isPawnPromotion", "isEnpassantMove", "isCastleMove", "moveID")
+
     ranksToRows = {"1":7, "2":6, "3":5, "4":4, "5":3, "6":2, "7":1, "8":0}
     rowsToRanks = {v:k for k,v in ranksToRows.items()}
 
     filesToCols = {"a":0, "b":1, "c":2, "d":3,"e":4, "f":5, "g":6, "h":7}
     colsToFiles = {v:k for k,v in filesToCols.items()}
 
-    def __init__(self, startSq, endSq, board, isEnpassantMove=False, isCastleMove=False):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        self.isPawnPromotion = ((self.pieceMoved == "wp" and self.endRow == 0) or (self.pieceMoved == "bp" and self.endRow == 7))
+    # startSq and endSq are square numbers (row*8 + col), pieceMoved and pieceCaptured are piece codes
+    def __init__(self, startSq, endSq, pieceMoved, pieceCaptured=EMPTY, isEnpassantMove=False, isCastleMove=False):
+        self.startSq = startSq
+        self.endSq = endSq
+        self.startRow = startSq >> 3
+        self.startCol = startSq & 7
+        self.endRow = endSq >> 3
+        self.endCol = endSq & 7
+        self.pieceMoved = pieceMoved
+        self.pieceCaptured = pieceCaptured
+        self.isPawnPromotion = ((pieceMoved == WHITE | PAWN and self.endRow == 0) or (pieceMoved == BLACK | PAWN and self.endRow == 7))
         self.isEnpassantMove = isEnpassantMove
-        if self.isEnpassantMove:
-            self.pieceCaptured = "wp" if self.pieceMoved == "bp" else "bp"
         # Castle move
         self.isCastleMove = isCastleMove
-        self.moveID = 1000*self.startRow + 100*self.startCol + 10*self.endRow + self.endCol
-    
+        self.moveID = endSq << 6 | startSq # the same square bits as the packed int move
+
+    @classmethod
+    def fromInt(cls, move):
+        return cls(moveFrom(move), moveTo(move), movePiece(move), moveCaptured(move),
+                   isEnpassantMove=bool(move & ENPASSANT_FLAG), isCastleMove=bool(move & CASTLE_FLAG))
+
     # Overriding the equals method
     def __eq__(self, other):
         if isinstance(other, Move):
@@ -338,4 +691,4 @@ class Move():
         return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
 
     def getRankFile(self, row, col):
-        return self.colsToFiles[col] + self.rowsToRanks[row]
\ No newline at end of file
+        return self.colsToFiles[col] + self.rowsToRanks[row]
@@ -8,40 +8,91 @@ WIDTH = HEIGHT = 512
 DIMENSION = 8 # dimensions of a chess board are 8x8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15 # for animation later on 
+COLORS = (p.Color("white"), p.Color("gray")) # light and dark square colors
 IMAGES = {}
+PIECE_ATLAS = None # every piece image side by side on one surface, so all piece blits read from the same source
+PIECE_AREAS = [None] * len(ChessEngine.PIECE_NAMES) # area of each piece in PIECE_ATLAS, indexed by piece code
+PIECE_BLITS = [None] * (64*16) # ready made blits argument for each piece on each square, indexed by sq*16 + piece code
+SQUARE_RECTS = [p.Rect((sq % DIMENSION)*SQ_SIZE, (sq // DIMENSION)*SQ_SIZE, SQ_SIZE, SQ_SIZE) for sq in range(DIMENSION*DIMENSION)] # screen rect of each square, indexed by row*8 + col
+BOARD_SURFACE = None # the empty board, drawn once by initBoard and blitted every frame
+FRAME_SURFACE = None # off-screen copy of the board, highlights and pieces, changed squares are drawn here and then copied to the screen
+SELECTED_HIGHLIGHT = None # translucent squares laid over the selected piece and the squares it can move to
+MOVE_HIGHLIGHT = None
 
 def loadImages():
+    global PIECE_ATLAS
     pieces = ["wp", "wR", "wN", "wB", "wK", "wQ", "bp", "bR", "bN", "bB", "bK", "bQ", ]
 
     for piece in pieces:
-        IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
+        # convert_alpha puts the image in the display's pixel format so blits don't convert every frame, it needs set_mode called first
+        IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE)).convert_alpha()
     # Note: we can access a piece by saying <IMAGES['wp']> for example
+    # Copy the images into the atlas, the drawing code blits from the atlas with the piece's area
+    PIECE_ATLAS = p.Surface((len(ChessEngine.PIECES)*SQ_SIZE, SQ_SIZE), p.SRCALPHA).convert_alpha()
+    for i, piece in enumerate(ChessEngine.PIECES):
+        PIECE_AREAS[piece] = p.Rect(i*SQ_SIZE, 0, SQ_SIZE, SQ_SIZE)
+        PIECE_ATLAS.blit(IMAGES[ChessEngine.PIECE_NAMES[piece]], PIECE_AREAS[piece])
+        for sq in range(DIMENSION*DIMENSION):
+            PIECE_BLITS[sq*16 + piece] = (PIECE_ATLAS, SQUARE_RECTS[sq], PIECE_AREAS[piece])
+
+# Draw the squares of the board once onto BOARD_SURFACE and make the other surfaces the drawing code reuses
+def initBoard():
+    global BOARD_SURFACE, FRAME_SURFACE, SELECTED_HIGHLIGHT, MOVE_HIGHLIGHT
+    BOARD_SURFACE = p.Surface((WIDTH, HEIGHT))
+    for row in range(DIMENSION):
+        for column in range(DIMENSION):
+            color = COLORS[(row ^ column) & 1]
+            p.draw.rect(BOARD_SURFACE, color, SQUARE_RECTS[row*8 + column])
+    FRAME_SURFACE = p.Surface((WIDTH, HEIGHT)).convert()
+    SELECTED_HIGHLIGHT = p.Surface((SQ_SIZE, SQ_SIZE))
+    SELECTED_HIGHLIGHT.set_alpha(100) # transparency value, 0 = transparent 255 = opaque
+    SELECTED_HIGHLIGHT.fill(p.Color("blue"))
+    MOVE_HIGHLIGHT = p.Surface((SQ_SIZE, SQ_SIZE))
+    MOVE_HIGHLIGHT.set_alpha(100)
+    MOVE_HIGHLIGHT.fill(p.Color("yellow"))
 
 # The main driver for our code.
 # This will handle user input and updating the graphics.
 def main():
     p.init()
-    screen = p.display.set_mode((WIDTH, HEIGHT))
+    # SCALED presents the screen through an SDL renderer texture, so the copy to the window and any scaling happen on the GPU
+    screen = p.display.set_mode((WIDTH, HEIGHT), p.SCALED | p.DOUBLEBUF)
+    # Only queue the events the main loop handles, SDL drops the rest (mouse motion mostly) before they become Python objects
+    p.event.set_blocked(None)
+    p.event.set_allowed([p.QUIT, p.MOUSEBUTTONDOWN, p.KEYDOWN, p.WINDOWEXPOSED])
     clock = p.time.Clock()
-    screen.fill(p.Color("white"))
     gs = ChessEngine.GameState()
     validMoves = gs.getValidMoves()
     moveMade = False # flag variable for when a move is made
     animate = False # flag variable for when we should animate a move
     loadImages() # only do this once, before the while loop
+    initBoard()
     running = True
     sqSelected = () # no square is selected, keep track of the last click of the user (tuple: (row,col))
     playerClicks = [] # keep track of player clicks (two tuples: [(6,4), (4,4)])
     gameOver = False
     playerOne = True # if a human is playing white, then this will be True. If an AI is playing, then false
     playerTwo = True # same as above but for black
+    # What is currently drawn on FRAME_SURFACE, so a frame only repaints the squares that changed since the last one
+    drawnBoard = None # None forces a full redraw
+    drawnHighlights = (None, frozenset())
+    drawnGameOver = False
+    screenStale = True # the screen no longer shows FRAME_SURFACE and needs all of it copied over
+    needsRedraw = True # nothing on screen can change until there is input or a move, so idle frames draw nothing
     while running:
         humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
-        for e in p.event.get():
+        events = p.event.get()
+        if not events and not needsRedraw and (humanTurn or gameOver):
+            events = [p.event.wait()] # nothing can happen until there is input, so sleep until it arrives instead of polling
+        for e in events:
             if e.type == p.QUIT:
                 running = False
+            elif e.type == p.WINDOWEXPOSED: # the window was covered, its contents need drawing again
+                screenStale = True
+                needsRedraw = True
             # Mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
+                needsRedraw = True
                 if not gameOver and humanTurn:    
                     location = p.mouse.get_pos() # (x,y) location of mouse
                     col = location[0] // SQ_SIZE
@@ -53,10 +104,12 @@ def main():
                         sqSelected = (row, col)
                         playerClicks.append(sqSelected) # append for both 1st and 2nd clicks
                     if len(playerClicks) == 2: # after 2nd click
-                        move = ChessEngine.Move(playerClicks[0], playerClicks[1], gs.board)
+                        startSq = playerClicks[0][0]*8 + playerClicks[0][1]
+                        endSq = playerClicks[1][0]*8 + playerClicks[1][1]
+                        move = ChessEngine.Move(startSq, endSq, gs.board[startSq], gs.board[endSq])
                         print(move.getChessNotation())
                         for i in range(len(validMoves)):
-                            if move == validMoves[i]:
+                            if ChessEngine.moveFrom(validMoves[i]) == startSq and ChessEngine.moveTo(validMoves[i]) == endSq:
                                 gs.makeMove(validMoves[i])
                                 moveMade = True
                                 animate = True
@@ -66,6 +119,7 @@ def main():
                             playerClicks = [sqSelected]
             # Key handler
             elif e.type == p.KEYDOWN:
+                needsRedraw = True
                 if e.key == p.K_z: # undo when "z" is pressed
                     gs.undoMove()
                     moveMade = True
@@ -90,65 +144,100 @@ def main():
 
         if moveMade:
             if animate:
-                animateMove(gs.moveLog[-1], screen, gs.board, clock)
+                animateMove(ChessEngine.Move.fromInt(gs.moveLog[-1]), screen, gs.board, clock)
+                screenStale = True # the animation drew over the whole board
             validMoves = gs.getValidMoves()
             moveMade = False
             animate = False
+            needsRedraw = True
 
-        
-        drawGameState(screen, gs, validMoves, sqSelected)
-        if gs.checkmate:
-            gameOver = True
-            if gs.whiteToMove:
-                drawText(screen, "Black wins by checkmate")
+        if needsRedraw:
+            if gs.checkmate or gs.stalemate:
+                gameOver = True
+            highlights = getHighlights(gs, validMoves, sqSelected)
+            # Bring the off-screen frame up to date, then copy to the screen only what changed
+            if drawnBoard is None:
+                drawGameState(FRAME_SURFACE, gs.board, highlights)
+                dirty = None
             else:
-                drawText(screen, "White wins by checkmate")
-        elif gs.stalemate:
-            gameOver = True
-            drawText(screen, "Stalemate!")
+                dirty = drawChangedSquares(FRAME_SURFACE, gs.board, highlights, drawnBoard, drawnHighlights)
+            if dirty is None or screenStale or gameOver != drawnGameOver: # copy everything, the end of game text lies across the board
+                screen.blit(FRAME_SURFACE, (0, 0))
+                if gs.checkmate:
+                    if gs.whiteToMove:
+                        drawText(screen, "Black wins by checkmate")
+                    else:
+                        drawText(screen, "White wins by checkmate")
+                elif gs.stalemate:
+                    drawText(screen, "Stalemate!")
+                p.display.flip()
+            elif dirty:
+                for square in dirty:
+                    screen.blit(FRAME_SURFACE, square, square)
+                p.display.update(dirty)
+            drawnBoard, drawnHighlights, drawnGameOver = bytes(gs.board), highlights, gameOver
+            screenStale = False
+            needsRedraw = False
         clock.tick(MAX_FPS)
-        p.display.flip()
 
-# Highlight square selected and possible moves for piece selected
-def highlightSquares(screen, gs, validMoves, sqSelected):
+# Square of the piece selected and the squares it can move to, (None, empty set) when no piece of the side to move is selected
+def getHighlights(gs, validMoves, sqSelected):
     if sqSelected != ():
         row, col = sqSelected
-        if gs.board[row][col][0] == ("w" if gs.whiteToMove else "b"):
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100) # transparency value, 0 = transparent 255 = opaque
-            s.fill(p.Color("blue"))
-            screen.blit(s, (col*SQ_SIZE, row*SQ_SIZE))
-            # Highlight moves from that square
-            s.fill(p.Color("yellow"))
-            for move in validMoves:
-                if move.startRow == row and move.startCol == col:
-                    screen.blit(s, (SQ_SIZE*move.endCol, SQ_SIZE*move.endRow))
+        sq = row*8 + col
+        piece = gs.board[sq]
+        if piece != ChessEngine.EMPTY and piece & ChessEngine.BLACK == (ChessEngine.WHITE if gs.whiteToMove else ChessEngine.BLACK):
+            return sq, frozenset(ChessEngine.moveTo(move) for move in validMoves if ChessEngine.moveFrom(move) == sq)
+    return None, frozenset()
+
+# Highlight square selected and possible moves for piece selected
+def highlightSquares(screen, highlights):
+    selected, targets = highlights
+    if selected is not None:
+        screen.blit(SELECTED_HIGHLIGHT, SQUARE_RECTS[selected])
+        # Highlight moves from that square
+        for sq in targets:
+            screen.blit(MOVE_HIGHLIGHT, SQUARE_RECTS[sq])
 
 # Responsible for all the graphics within a current game state.
-def drawGameState(screen, gs, validMoves, sqSelected):
+def drawGameState(screen, board, highlights):
     drawBoard(screen) # draw squares on the board
-    highlightSquares(screen, gs, validMoves, sqSelected)
-    drawPieces(screen, gs.board)
+    highlightSquares(screen, highlights)
+    drawPieces(screen, board)
+
+# Repaint only the squares whose piece or highlight differs from what was drawn last frame.
+# Returns the rects that changed, to be copied to the screen and passed to display.update.
+def drawChangedSquares(screen, board, highlights, drawnBoard, drawnHighlights):
+    changed = {sq for sq in range(DIMENSION*DIMENSION) if board[sq] != drawnBoard[sq]}
+    if highlights != drawnHighlights:
+        changed |= highlights[1] | drawnHighlights[1] | ({highlights[0], drawnHighlights[0]} - {None})
+    selected, targets = highlights
+    blit, boardSurface, atlas, areas, squares = screen.blit, BOARD_SURFACE, PIECE_ATLAS, PIECE_AREAS, SQUARE_RECTS
+    dirty = []
+    for sq in changed:
+        square = squares[sq]
+        blit(boardSurface, square, square)
+        if sq == selected:
+            blit(SELECTED_HIGHLIGHT, square)
+        elif sq in targets:
+            blit(MOVE_HIGHLIGHT, square)
+        piece = board[sq]
+        if piece:
+            blit(atlas, square, areas[piece])
+        dirty.append(square)
+    return dirty
 
 # Draw the squares on the board.
 def drawBoard(screen):
-    global colors
-    colors = [p.Color("white"), p.Color("gray")]
-    for row in range(DIMENSION):
-        for column in range(DIMENSION):
-            color = colors[((row + column) % 2)]
-            p.draw.rect(screen, color, p.Rect(column*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    screen.blit(BOARD_SURFACE, (0, 0))
 
 # Draw the pieces on the board using the current GameState.board.
+# All pieces go to pygame in one blits call rather than one blit call per piece.
 def drawPieces(screen, board):
-    for row in range(DIMENSION):
-        for column in range(DIMENSION):
-            piece = board[row][column]
-            if piece != "--": # not empty square
-                screen.blit(IMAGES[piece], p.Rect(column*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    pieceBlits = PIECE_BLITS # local, so the loop skips the global lookup
+    screen.blits([pieceBlits[sq*16 + piece] for sq, piece in enumerate(board) if piece], doreturn=False)
 
 def animateMove(move, screen, board, clock):
-    global colors
     coords = [] # list of coordinates the animation will move through
     dRow = move.endRow - move.startRow
     dCol = move.endCol - move.startCol
@@ -159,14 +248,14 @@ def animateMove(move, screen, board, clock):
         drawBoard(screen)
         drawPieces(screen, board)
         # Erase the piece moved from it's ending square
-        color = colors[(move.endRow + move.endCol) % 2]
-        endSquare = p.Rect(move.endCol*SQ_SIZE, move.endRow*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        color = COLORS[(move.endRow ^ move.endCol) & 1]
+        endSquare = SQUARE_RECTS[move.endSq]
         p.draw.rect(screen, color, endSquare)
         # Draw captured piece onto rectangle
-        if move.pieceCaptured != "--":
-            screen.blit(IMAGES[move.pieceCaptured], endSquare)
+        if move.pieceCaptured != ChessEngine.EMPTY:
+            screen.blit(PIECE_ATLAS, endSquare, PIECE_AREAS[move.pieceCaptured])
         # Draw moving piece
-        screen.blit(IMAGES[move.pieceMoved], p.Rect(col*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+        screen.blit(PIECE_ATLAS, p.Rect(col*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE), PIECE_AREAS[move.pieceMoved])
         p.display.flip()
         clock.tick(60)
     
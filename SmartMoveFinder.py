@@ -1,6 +1,7 @@
 import random
+import ChessEngine
 
-pieceScore = {"K":0, "Q":9, "B":3, "R":5, "p":1, "N":3}
+pieceScore = (0, 1, 3, 3, 5, 9, 0) # indexed by piece type: empty, pawn, knight, bishop, rook, queen, king
 CHECKMATE = 1000
 STALEMATE = 0
 
@@ -9,6 +10,7 @@ def findRandomMove(validMoves):
 
 # Find the best move based on material alone
 def findBestMove(gs, validMoves):
+    gs.startSearch()
     turnMultiplier = 1 if gs.whiteToMove else -1
     bestPlayerMove = None
     opponentMinMaxScore = CHECKMATE
@@ -36,11 +38,10 @@ def findBestMove(gs, validMoves):
 # Score the board based on material
 def scoreMaterial(board):
     score = 0
-    for row in board:
-        for square in row:
-            if square[0] == "w":
-                score += pieceScore[square[1]]
-            elif square[0] == "b":
-                score -= pieceScore[square[1]]
+    for square in board:
+        if square & ChessEngine.BLACK:
+            score -= pieceScore[square & 7]
+        else:
+            score += pieceScore[square & 7]
     return score
 